@@ -0,0 +1,217 @@
+# opcode n-gram feature extraction built directly on the decoder
+# produces integer id sequences and n-gram histograms without formatting any text
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from byte_utils import get_file
+from disassemble import disassemble
+from instruction_data import ENCODINGS, GLOBAL_INSTRUCTIONS_MAP
+
+
+# Reduce a display mnemonic to its n-gram token
+# The map spells the eax-immediate forms as e.g. "add eax,", the operand form is
+# already in the encoding stream so those share a token with every other "add"
+# Prefixed mnemonics such as "repne cmpsd" stay a single token
+def mnemonic_token(mnemonic: str) -> str:
+    return mnemonic.removesuffix(" eax,")
+
+
+# Build the mnemonic vocabulary from the instruction map and its extension maps
+# Id 0 is reserved for "db" (bytes that did not decode to an instruction)
+def build_mnemonic_ids() -> Dict[str, int]:
+    mnemonic_ids = {"db": 0}
+    for instruction_info in GLOBAL_INSTRUCTIONS_MAP.values():
+        if instruction_info.mnemonic is not None:
+            mnemonic_ids.setdefault(
+                mnemonic_token(instruction_info.mnemonic), len(mnemonic_ids)
+            )
+        if instruction_info.extension_map:
+            for mnemonic in instruction_info.extension_map.values():
+                mnemonic_ids.setdefault(mnemonic_token(mnemonic), len(mnemonic_ids))
+    return mnemonic_ids
+
+
+# Build the encoding vocabulary, id 0 is "db" and every encoding keeps its enum value
+def build_encoding_ids() -> Dict[str, int]:
+    encoding_ids = {"db": 0}
+    for encoding in ENCODINGS:
+        encoding_ids[encoding.name] = encoding.value
+    return encoding_ids
+
+
+GLOBAL_MNEMONIC_IDS = build_mnemonic_ids()
+GLOBAL_ENCODING_IDS = build_encoding_ids()
+
+# Vocabulary sizes used as the base of the n-gram index
+MNEMONIC_VOCAB_SIZE = len(GLOBAL_MNEMONIC_IDS)
+ENCODING_VOCAB_SIZE = max(GLOBAL_ENCODING_IDS.values()) + 1
+
+
+# Decode a binary blob into parallel mnemonic-id and encoding-id arrays
+# Follows the same linear sweep as disassemble.linear_sweep, but skips labels and text
+def instruction_sequences(data: bytes) -> Tuple[np.ndarray, np.ndarray]:
+    # memoryview slices are zero-copy, so the sweep stays linear in the file size
+    view = memoryview(data)
+    mnemonic_seq = []
+    encoding_seq = []
+    counter = 0
+
+    while counter < len(view):
+        instruction, instruction_size = disassemble(view[counter:], counter)
+
+        # Data bytes get id 0 in both vocabularies
+        if instruction.is_db:
+            mnemonic_seq.append(0)
+            encoding_seq.append(0)
+        else:
+            mnemonic_seq.append(GLOBAL_MNEMONIC_IDS[mnemonic_token(instruction.mnemonic)])
+            encoding_seq.append(instruction.encoding.value)
+
+        counter += instruction_size
+
+    return (
+        np.array(mnemonic_seq, dtype=np.int64),
+        np.array(encoding_seq, dtype=np.int64),
+    )
+
+
+# Decode a binary file into mnemonic-id and encoding-id arrays
+def file_sequences(filename: str) -> Tuple[np.ndarray, np.ndarray]:
+    return instruction_sequences(get_file(filename))
+
+
+# Total number of features for 1..k-grams over a vocabulary
+def ngram_feature_count(vocab_size: int, k: int) -> int:
+    return sum(vocab_size**n for n in range(1, k + 1))
+
+
+# Map every 1..k-gram of a sequence to its feature index
+# An n-gram (s0, ..., sn-1) is encoded in base vocab_size, then shifted past
+# the index range of all shorter n-grams so that every order has its own block
+def ngram_indices(ids: np.ndarray, vocab_size: int, k: int) -> np.ndarray:
+    if k < 1:
+        raise ValueError(f"Invalid n-gram order {k}, must be at least 1")
+    if ngram_feature_count(vocab_size, k) > np.iinfo(np.int64).max:
+        raise ValueError(f"n-gram order {k} is too large for vocabulary size {vocab_size}")
+
+    ids = np.asarray(ids, dtype=np.int64)
+    blocks = []
+    block_offset = 0
+    codes = np.zeros(len(ids), dtype=np.int64)
+
+    # Extend the codes of (n-1)-grams by one symbol to get the n-grams
+    for n in range(1, k + 1):
+        if len(ids) < n:
+            break
+        codes = codes[: len(ids) - n + 1] * vocab_size + ids[n - 1 :]
+        blocks.append(codes + block_offset)
+        block_offset += vocab_size**n
+
+    if not blocks:
+        return np.zeros(0, dtype=np.int64)
+    return np.concatenate(blocks)
+
+
+# Count the 1..k-grams of a sequence as a dense vector of length ngram_feature_count
+def ngram_histogram(ids: np.ndarray, vocab_size: int, k: int) -> np.ndarray:
+    return np.bincount(
+        ngram_indices(ids, vocab_size, k),
+        minlength=ngram_feature_count(vocab_size, k),
+    )
+
+
+# Vocabulary size for a token kind ("mnemonic" or "encoding")
+def token_vocab_size(tokens: str) -> int:
+    if tokens == "mnemonic":
+        return MNEMONIC_VOCAB_SIZE
+    elif tokens == "encoding":
+        return ENCODING_VOCAB_SIZE
+    else:
+        raise ValueError(f"Invalid token kind {tokens}, expected mnemonic or encoding")
+
+
+# Compute the non-zero n-gram counts of one file as (feature indices, counts)
+def file_ngram_counts(
+    filename: str, k: int, tokens: str = "mnemonic"
+) -> Tuple[np.ndarray, np.ndarray]:
+    vocab_size = token_vocab_size(tokens)
+    mnemonic_seq, encoding_seq = file_sequences(filename)
+    ids = mnemonic_seq if tokens == "mnemonic" else encoding_seq
+    return np.unique(ngram_indices(ids, vocab_size, k), return_counts=True)
+
+
+# Worker entry point for the process pool (must be a module-level function to pickle)
+# A file that cannot be read yields an empty row and a failed flag instead of an
+# exception, so one bad sample does not abort the rest of the batch
+def file_ngram_counts_job(
+    job: Tuple[str, int, str]
+) -> Tuple[np.ndarray, np.ndarray, bool]:
+    try:
+        indices, counts = file_ngram_counts(*job)
+    except OSError:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, True
+    return indices, counts, False
+
+
+# List the regular files of a directory in a stable order
+def list_samples(directory: str) -> List[str]:
+    return sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if os.path.isfile(os.path.join(directory, name))
+    )
+
+
+# Extract 1..k-gram count vectors for every file in a directory, one row per file
+# Files are decoded in parallel worker processes, which only send back the
+# non-zero counts, and the rows are assembled into a dense array or a CSR matrix
+# Returns (matrix, filenames, failed), files in failed could not be read and have empty rows
+def extract_directory(
+    directory: str,
+    k: int,
+    tokens: str = "mnemonic",
+    sparse: bool = False,
+    workers: Optional[int] = None,
+    chunksize: int = 16,
+):
+    # scipy is only needed for sparse output, check for it before decoding anything
+    if sparse:
+        try:
+            from scipy.sparse import csr_matrix
+        except ImportError as err:
+            raise ImportError("scipy is required for sparse feature matrices") from err
+
+    filenames = list_samples(directory)
+    n_features = ngram_feature_count(token_vocab_size(tokens), k)
+    jobs = [(filename, k, tokens) for filename in filenames]
+
+    # Decode in parallel, results come back in the same order as filenames
+    if workers == 1:
+        results = [file_ngram_counts_job(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(file_ngram_counts_job, jobs, chunksize=chunksize))
+
+    # Flatten the per-file counts into CSR components
+    indptr = np.zeros(len(results) + 1, dtype=np.int64)
+    for row, (indices, _, _) in enumerate(results):
+        indptr[row + 1] = indptr[row] + len(indices)
+    indices = np.concatenate([r[0] for r in results] or [np.zeros(0, dtype=np.int64)])
+    counts = np.concatenate([r[1] for r in results] or [np.zeros(0, dtype=np.int64)])
+
+    if sparse:
+        matrix = csr_matrix(
+            (counts, indices, indptr), shape=(len(filenames), n_features)
+        )
+    else:
+        matrix = np.zeros((len(filenames), n_features), dtype=np.int64)
+        rows = np.repeat(np.arange(len(filenames)), np.diff(indptr))
+        matrix[rows, indices] = counts
+
+    failed = [filename for filename, result in zip(filenames, results) if result[2]]
+
+    return matrix, filenames, failed
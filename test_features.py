@@ -0,0 +1,126 @@
+# tests for the opcode n-gram feature extraction in features.py
+# run with: python -m unittest test_features
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from disassemble import linear_sweep
+from features import (
+    GLOBAL_MNEMONIC_IDS,
+    MNEMONIC_VOCAB_SIZE,
+    ENCODING_VOCAB_SIZE,
+    extract_directory,
+    file_sequences,
+    list_samples,
+    mnemonic_token,
+    ngram_feature_count,
+    ngram_histogram,
+    ngram_indices,
+)
+
+SAMPLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sample-inputs")
+
+
+class TestMnemonicIds(unittest.TestCase):
+    # eax-immediate forms share a token with the other forms of the same mnemonic
+    def test_eax_forms_share_token(self):
+        for mnemonic in ["add", "and", "cmp", "or", "test", "xor"]:
+            self.assertEqual(mnemonic_token(f"{mnemonic} eax,"), mnemonic)
+            self.assertNotIn(f"{mnemonic} eax,", GLOBAL_MNEMONIC_IDS)
+
+    # prefixed mnemonics stay a single token
+    def test_prefixed_mnemonic_kept(self):
+        self.assertIn("repne cmpsd", GLOBAL_MNEMONIC_IDS)
+        self.assertEqual(GLOBAL_MNEMONIC_IDS["db"], 0)
+
+
+class TestInstructionSequences(unittest.TestCase):
+    # the id sequences match the instructions decoded by linear_sweep
+    def test_matches_linear_sweep(self):
+        for filename in list_samples(SAMPLE_DIR):
+            with self.subTest(filename=filename):
+                output_list, _ = linear_sweep(filename)
+                instructions = [output_list[offset][0] for offset in sorted(output_list)]
+                expected_mnemonics = [
+                    0 if i.is_db else GLOBAL_MNEMONIC_IDS[mnemonic_token(i.mnemonic)]
+                    for i in instructions
+                ]
+                expected_encodings = [
+                    0 if i.is_db else i.encoding.value for i in instructions
+                ]
+
+                mnemonic_seq, encoding_seq = file_sequences(filename)
+                self.assertEqual(mnemonic_seq.tolist(), expected_mnemonics)
+                self.assertEqual(encoding_seq.tolist(), expected_encodings)
+
+
+class TestNgramIndices(unittest.TestCase):
+    # 1-grams are the ids themselves, 2-grams sit at V + a*V + b
+    def test_layout(self):
+        V = 3
+        ids = np.array([1, 2, 1, 2])
+        expected = [1, 2, 1, 2] + [V + 1 * V + 2, V + 2 * V + 1, V + 1 * V + 2]
+        self.assertEqual(ngram_indices(ids, V, 2).tolist(), expected)
+        self.assertEqual(ngram_feature_count(V, 2), V + V**2)
+
+    # 3-grams sit at V + V^2 + a*V^2 + b*V + c
+    def test_layout_trigram(self):
+        V = 4
+        ids = np.array([3, 0, 2])
+        indices = ngram_indices(ids, V, 3).tolist()
+        self.assertEqual(indices[-1], V + V**2 + 3 * V**2 + 0 * V + 2)
+
+    # orders longer than the sequence contribute nothing
+    def test_short_sequence(self):
+        V = 3
+        indices = ngram_indices(np.array([1, 2]), V, 3)
+        self.assertFalse((indices >= V + V**2).any())
+        self.assertEqual(ngram_indices(np.array([], dtype=np.int64), V, 3).size, 0)
+
+    def test_invalid_order(self):
+        with self.assertRaises(ValueError):
+            ngram_indices(np.array([1]), 3, 0)
+
+
+class TestExtractDirectory(unittest.TestCase):
+    # dense and sparse matrices agree with each other and with ngram_histogram
+    def check_directory(self, directory, k, tokens, vocab_size):
+        dense, filenames, failed = extract_directory(directory, k, tokens=tokens)
+        sparse, sparse_filenames, _ = extract_directory(
+            directory, k, tokens=tokens, sparse=True, workers=1
+        )
+
+        self.assertEqual(failed, [])
+        self.assertEqual(filenames, sparse_filenames)
+        self.assertEqual(dense.shape, (len(filenames), ngram_feature_count(vocab_size, k)))
+        self.assertEqual(sparse.shape, dense.shape)
+        self.assertTrue((sparse.toarray() == dense).all())
+
+        for row, filename in enumerate(filenames):
+            mnemonic_seq, encoding_seq = file_sequences(filename)
+            ids = mnemonic_seq if tokens == "mnemonic" else encoding_seq
+            self.assertTrue((dense[row] == ngram_histogram(ids, vocab_size, k)).all())
+
+    def test_samples(self):
+        self.check_directory(SAMPLE_DIR, 2, "mnemonic", MNEMONIC_VOCAB_SIZE)
+        self.check_directory(SAMPLE_DIR, 3, "encoding", ENCODING_VOCAB_SIZE)
+
+    def test_empty_directory(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.check_directory(directory, 2, "mnemonic", MNEMONIC_VOCAB_SIZE)
+
+    def test_empty_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            open(os.path.join(directory, "empty"), "wb").close()
+            with open(os.path.join(directory, "nop"), "wb") as f:
+                f.write(b"\x90\x90")
+            self.check_directory(directory, 2, "mnemonic", MNEMONIC_VOCAB_SIZE)
+
+            dense, filenames, _ = extract_directory(directory, 2, workers=1)
+            self.assertEqual(dense[filenames.index(os.path.join(directory, "empty"))].sum(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()